@@ -32,6 +32,31 @@ STORAGE_PATH = config("STORAGE_PATH")
 MAX_FILE_SIZE = config("MAX_FILE_SIZE", cast=int)
 
 API_V1_PREFIX = "/api/v1"
+
+# hidden dir at the storage root where writes are built before being moved into place
+STAGING_DIR = ".pi-cloud-staging"
+# staged files untouched for this long are leftovers of interrupted writes
+STAGING_MAX_AGE_HOURS = config("STAGING_MAX_AGE_HOURS", default=1, cast=int)
 CORS_ORIGINS = config("CORS_ORIGINS")
 
-os.makedirs(STORAGE_PATH, exist_ok=True)
\ No newline at end of file
+# demo uploads older than this are removed by the periodic cleanup
+DEMO_MAX_AGE_HOURS = config("DEMO_MAX_AGE_HOURS", default=2, cast=int)
+DEMO_CLEANUP_INTERVAL_SECONDS = config("DEMO_CLEANUP_INTERVAL_SECONDS", default=60 * 120, cast=int)
+
+# inotify watcher feeding the change feed with out-of-band edits
+WATCH_STORAGE = config("WATCH_STORAGE", default=True, cast=bool)
+
+# per-worker transfer shaping, rates in bytes/second (0 = unlimited)
+TRANSFER_MAX_PER_USER = config("TRANSFER_MAX_PER_USER", default=2, cast=int)
+TRANSFER_MAX_QUEUED_PER_USER = config("TRANSFER_MAX_QUEUED_PER_USER", default=4, cast=int)
+TRANSFER_USER_RATE = config("TRANSFER_USER_RATE", default=0, cast=int)
+TRANSFER_GLOBAL_RATE = config("TRANSFER_GLOBAL_RATE", default=0, cast=int)
+TRANSFER_CHUNK_SIZE = config("TRANSFER_CHUNK_SIZE", default=256 * 1024, cast=int)
+
+# file hashes remembered for /files/tree, keyed by inode+mtime+size
+HASH_CACHE_ENTRIES = config("HASH_CACHE_ENTRIES", default=20000, cast=int)
+
+# requests slower than this (to first byte) get their stacks sampled and logged
+SLOW_REQUEST_MS = config("SLOW_REQUEST_MS", default=1000, cast=int)
+PROFILE_INTERVAL_MS = config("PROFILE_INTERVAL_MS", default=10, cast=int)
+PROFILE_MAX_SECONDS = config("PROFILE_MAX_SECONDS", default=300, cast=int)
\ No newline at end of file
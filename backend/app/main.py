@@ -1,13 +1,24 @@
+import time
+_import_started = time.perf_counter()
+
 from typing import Union
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.config import API_V1_PREFIX, CORS_ORIGINS
-from app.routers import health, auth, files
+from app.config import (
+    API_V1_PREFIX, CORS_ORIGINS, STORAGE_PATH, WATCH_STORAGE,
+    DEMO_MAX_AGE_HOURS, DEMO_CLEANUP_INTERVAL_SECONDS, STAGING_MAX_AGE_HOURS,
+)
+from app.routers import health, auth, files, admin
+from app.middleware.timing import TimingMiddleware
 from fastapi import FastAPI, HTTPException
 from fastapi.responses import JSONResponse
-from fastapi_utilities import repeat_every
-from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager, contextmanager
 from app.services.file_service import FileService
+from app.services.change_feed import change_feed
+from app.services.auth import auth_service
+from pathlib import Path
+import asyncio
 import logging
 
 # loggin set up
@@ -17,14 +28,63 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# app with lifespan to register repeated tasks (replaces deprecated on_event)
+# first demo cleanup waits this long so it doesn't compete with startup
+DEMO_CLEANUP_START_DELAY_SECONDS = 60
+
+@contextmanager
+def startup_phase(phases: dict, name: str):
+    started = time.perf_counter()
+    yield
+    phases[name] = time.perf_counter() - started
+
+def cleanup_demo_job() -> None:
+    try:
+        service = FileService()
+        deleted = service.cleanup_demo_uploads(max_age_hours=DEMO_MAX_AGE_HOURS)
+        if deleted:
+            logger.info(f"Demo cleanup removed {deleted} items")
+        deleted = service.cleanup_staging(max_age_hours=STAGING_MAX_AGE_HOURS)
+        if deleted:
+            logger.info(f"Removed {deleted} abandoned staged files")
+    except Exception as e:
+        logger.error(f"Demo cleanup error: {e}")
+
+async def demo_cleanup_loop(stop_event: asyncio.Event):
+    delay = DEMO_CLEANUP_START_DELAY_SECONDS
+    while True:
+        try:
+            await asyncio.wait_for(stop_event.wait(), delay)
+            return
+        except asyncio.TimeoutError:
+            pass
+        await run_in_threadpool(cleanup_demo_job)
+        delay = DEMO_CLEANUP_INTERVAL_SECONDS
+
+# app with lifespan to run startup work and background tasks (replaces deprecated on_event)
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # --- startup ---
-    # The @repeat_every decorator automatically registers the cleanup_demo_job
-    # No need to call it manually - it will run on schedule
+    # keep this cheap, every worker runs it before serving; anything heavy is lazy
+    phases = {}
+    stop_event = asyncio.Event()
+    tasks = []
+    with startup_phase(phases, "storage"):
+        FileService().ensure_storage()
+    with startup_phase(phases, "watcher"):
+        if WATCH_STORAGE:
+            tasks.append(asyncio.create_task(change_feed.watch(Path(STORAGE_PATH), stop_event)))
+    with startup_phase(phases, "auth"):
+        # bcrypt in the background, readiness doesn't wait for it
+        tasks.append(asyncio.create_task(asyncio.to_thread(auth_service.prepare_password_hashes)))
+    with startup_phase(phases, "demo_cleanup"):
+        tasks.append(asyncio.create_task(demo_cleanup_loop(stop_event)))
+
+    breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases.items())
+    logger.info(f"Startup: imports {IMPORT_SECONDS * 1000:.0f}ms, lifespan {breakdown}")
     yield
     # --- shutdown ---
+    stop_event.set()
+    await asyncio.gather(*tasks)
 
 app = FastAPI(
     title="Personal File Server",
@@ -58,21 +118,16 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(TimingMiddleware)
 
 app.include_router(health.router)
 app.include_router(auth.router, prefix=API_V1_PREFIX)
 app.include_router(files.router, prefix=API_V1_PREFIX)
+app.include_router(admin.router, prefix=API_V1_PREFIX)
 
-@repeat_every(seconds=60*120)  # every 2 hours
-def cleanup_demo_job() -> None:
-    try:
-        service = FileService()
-        deleted = service.cleanup_demo_uploads(max_age_hours=2)
-        if deleted:
-            logger.info(f"Demo cleanup removed {deleted} items")
-    except Exception as e:
-        logger.error(f"Demo cleanup error: {e}")
+IMPORT_SECONDS = time.perf_counter() - _import_started
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,75 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.services.profiler import profiler
+
+# phases of the request being handled, None outside the middleware
+_phases: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_phases", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """add the time spent in the block to the current request's phase"""
+    phases = _phases.get()
+    if phases is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[phase] = phases.get(phase, 0.0) + time.perf_counter() - started
+
+
+class TimingMiddleware:
+    """
+    Per-request phase breakdown (auth, path, fs, serialize) reported as a
+    Server-Timing header, plus stack capture for requests over the slow
+    threshold. Requests are timed from the end of the request body to the
+    response headers, so long uploads, downloads and event streams don't
+    count as slow. Plain ASGI so streaming bodies pass straight through.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        phases: Dict[str, float] = {}
+        token = _phases.set(phases)
+        request = profiler.slow_requests.track(scope["method"], scope["path"])
+        finished = False
+
+        async def receive_with_timing() -> Message:
+            message = await receive()
+            if message["type"] == "http.request" and not finished:
+                if message.get("more_body", False):
+                    profiler.slow_requests.pause(request)
+                else:
+                    profiler.slow_requests.restart(request)
+            return message
+
+        async def send_with_timing(message: Message):
+            nonlocal finished
+            if message["type"] == "http.response.start":
+                finished = True
+                total = profiler.slow_requests.finish(request, phases) * 1000
+                entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in phases.items()]
+                entries.append(f"total;dur={total:.2f}")
+                MutableHeaders(scope=message).append("Server-Timing", ", ".join(entries))
+            await send(message)
+
+        try:
+            await self.app(scope, receive_with_timing, send_with_timing)
+        finally:
+            if not finished:
+                profiler.slow_requests.finish(request, phases)
+            _phases.reset(token)
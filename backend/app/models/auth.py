@@ -11,4 +11,7 @@ class LoginResponse(BaseModel):
 
 class UserInfo(BaseModel): 
     username: str
-    permissions: List[str]
\ No newline at end of file
+    permissions: List[str]
+class StreamTicket(BaseModel):
+    ticket: str
+    expires_in: int
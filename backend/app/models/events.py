@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from enum import Enum
+
+class ChangeType(str, Enum):
+    CREATED = "created"
+    MODIFIED = "modified"
+    DELETED = "deleted"
+    # subscriber missed events (overflow or stale resume token), refetch the directory
+    RESYNC = "resync"
+
+class ChangeEvent(BaseModel):
+    id: str
+    type: ChangeType
+    path: str
+    name: str
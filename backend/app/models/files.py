@@ -18,4 +18,11 @@ class DirectoryListing(BaseModel):
     path: str
     items: List[FileItem]
     total_items: int
-    
\ No newline at end of file
+
+class FileSignature(BaseModel):
+    path: str
+    version: str
+    block_size: int
+    size: int
+    weak: List[int]
+    strong: List[str]
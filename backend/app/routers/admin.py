@@ -0,0 +1,50 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from app.config import PROFILE_MAX_SECONDS
+from app.routers.auth import require_admin
+from app.services.profiler import profiler, folded
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+# profiles live in the worker that served the start request, responses carry its pid
+
+@router.post("/profile/start")
+async def start_profile(
+    duration: float = Query(30, gt=0, le=PROFILE_MAX_SECONDS, description="Seconds to sample for"),
+    interval_ms: float = Query(10, ge=1, le=1000, description="Sampling interval"),
+    current_user: dict = Depends(require_admin)
+):
+    session = profiler.start(duration, interval_ms)
+    if session is None:
+        raise HTTPException(status_code=409, detail="A profile is already running in this worker")
+    return session.status()
+
+@router.post("/profile/stop")
+async def stop_profile(current_user: dict = Depends(require_admin)):
+    session = profiler.stop()
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profile in this worker")
+    return session.status()
+
+@router.get("/profile")
+async def download_profile(current_user: dict = Depends(require_admin)):
+    # collapsed stacks, feed to flamegraph.pl or load in speedscope
+    session = profiler.session
+    if session is None:
+        raise HTTPException(status_code=404, detail="No profile in this worker")
+    if session.running:
+        raise HTTPException(status_code=409, detail="Profile still running")
+    return PlainTextResponse(
+        folded(session.stacks),
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}.folded"'}
+    )
+
+@router.get("/slow-requests")
+async def slow_requests(current_user: dict = Depends(require_admin)):
+    # most recent captures first
+    return {
+        "pid": os.getpid(),
+        "threshold_ms": profiler.slow_requests.threshold * 1000,
+        "requests": list(reversed(profiler.slow_requests.captures))
+    }
@@ -1,18 +1,49 @@
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query
+from typing import Optional
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from app.models.auth import LoginRequest, LoginResponse, UserInfo
-from app.services.auth import auth_service
+from starlette.concurrency import run_in_threadpool
+from app.models.auth import LoginRequest, LoginResponse, UserInfo, StreamTicket
+from app.services.auth import auth_service, STREAM_SCOPE, STREAM_TICKET_SECONDS
+from app.middleware.timing import timed
+from app.utils.exceptions import PermissionDeniedError
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 # dependency to get current authenticated user from JWT token
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
-    return auth_service.verify_token(credentials.credentials)
+    with timed("auth"):
+        return auth_service.verify_token(credentials.credentials)
+
+# same as above, but EventSource can't set headers so streams also accept a ?ticket=
+async def get_stream_user(
+    ticket: Optional[str] = Query(None, description="Stream ticket from POST /auth/stream-ticket"),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security)
+) -> dict:
+    if credentials:
+        with timed("auth"):
+            return auth_service.verify_token(credentials.credentials)
+    if ticket:
+        with timed("auth"):
+            return auth_service.verify_token(ticket, scope=STREAM_SCOPE)
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Not authenticated",
+        headers={"WWW-Authenticate": "Bearer"}
+    )
+
+# dependency for operator-only endpoints
+async def require_admin(current_user: dict = Depends(get_current_user)) -> dict:
+    if "admin" not in current_user["permissions"]:
+        raise PermissionDeniedError("admin only")
+    return current_user
 
 @router.post("/login", response_model=LoginResponse)
 async def login(login_data: LoginRequest):
-    user = auth_service.authenticate_user(login_data.username, login_data.password)
+    # bcrypt takes hundreds of ms, keep it off the event loop
+    with timed("auth"):
+        user = await run_in_threadpool(auth_service.authenticate_user, login_data.username, login_data.password)
     if not user: 
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,6 +66,14 @@ async def demo_login():
         token_type="bearer"
     )
 
+# ticket for opening an event stream, expires quickly, fetch a new one per connect
+@router.post("/stream-ticket", response_model=StreamTicket)
+async def stream_ticket(current_user: dict = Depends(get_current_user)):
+    return StreamTicket(
+        ticket=auth_service.create_stream_ticket(current_user["username"]),
+        expires_in=STREAM_TICKET_SECONDS
+    )
+
 @router.get("/me", response_model=UserInfo)
 async def get_current_user_info(current_user: dict = Depends(get_current_user)):
     return UserInfo(
@@ -1,35 +1,155 @@
-from fastapi import APIRouter, Query, Depends, UploadFile, File, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Query, Depends, HTTPException, Header, Request
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from typing import List, Optional
 import urllib.parse
-from app.models.files import DirectoryListing, FileItem
+from app.models.files import DirectoryListing, FileItem, FileSignature
 from app.services.file_service import FileService
-from app.routers.auth import get_current_user
+from app.services.change_feed import change_feed
+from app.services.transfers import transfer_scheduler
+from app.services.delta_sync import MIN_BLOCK_SIZE, MAX_BLOCK_SIZE
+from app.routers.auth import get_current_user, get_stream_user
+from app.utils.responses import etag_matches, json_response, not_modified_response
 
 router = APIRouter(prefix="/files", tags=["files"])
 
+# comment line sent on idle streams so proxies don't time them out
+EVENTS_HEARTBEAT_SECONDS = 15
+
 def get_file_service():
     return FileService()
 
-@router.get("/list", response_model=DirectoryListing)
+# marks requests a user is waiting on, bulk transfers back off while they run
+async def interactive_request():
+    async with transfer_scheduler.interactive():
+        yield
+
+@router.get("/list", response_model=DirectoryListing, dependencies=[Depends(interactive_request)])
 async def list_directory(
     path: str = Query("/", description="Directory path to list"),
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
     file_service: FileService = Depends(get_file_service),
     current_user: dict = Depends(get_current_user)
 ):
+    # browsers always revalidate, an unchanged directory costs one stat()
+    cache_headers = {"Cache-Control": "private, no-cache", "Vary": "Authorization, Accept-Encoding"}
+    etag = file_service.directory_etag(path, current_user)
+    if etag_matches(if_none_match, etag):
+        return not_modified_response(etag, cache_headers)
+
     # lists directories contents
-    return await file_service.list_directory(path, current_user)
+    listing = await file_service.list_directory_payload(path, current_user)
+    return json_response(listing, etag=etag, accept_encoding=accept_encoding, headers=cache_headers)
+
+@router.get("/tree")
+async def tree_manifest(
+    path: str = Query("/", description="Root of the subtree"),
+    since: Optional[float] = Query(None, description="Only entries changed after this unix time (the \"since\" of a previous manifest's end line)"),
+    hash: bool = Query(False, description="Include sha256 of files"),
+    file_service: FileService = Depends(get_file_service),
+    current_user: dict = Depends(get_current_user)
+):
+    # recursive manifest as NDJSON; deletions aren't reported, diff a full manifest for those.
+    # hashing reads every uncached file, so it is admitted and shaped like a download
+    transfer = await transfer_scheduler.admit(current_user["username"]) if hash else None
+    try:
+        manifest = file_service.tree_manifest(path, current_user, since, hash, transfer)
+    except Exception:
+        if transfer:
+            transfer.release()
+        raise
+    return StreamingResponse(
+        manifest,
+        media_type="application/x-ndjson",
+        # release the slot even if the body is never iterated
+        background=BackgroundTask(transfer.release) if transfer else None
+    )
+
+@router.get("/events")
+async def directory_events(
+    request: Request,
+    path: str = Query("/", description="Directory path to watch"),
+    since: Optional[str] = Query(None, description="Resume token (id of the last event received)"),
+    last_event_id: Optional[str] = Header(None),
+    file_service: FileService = Depends(get_file_service),
+    current_user: dict = Depends(get_stream_user)
+):
+    # server-sent events for changes directly inside one directory
+    watch_path = file_service.change_feed_path(path, current_user)
+    resume_token = last_event_id or since
+
+    async def event_stream():
+        subscription = change_feed.subscribe(watch_path, resume_token)
+        try:
+            if not resume_token:
+                # hand out the current resume point so a reconnect can't miss anything
+                yield f"id: {change_feed.token}\nevent: ready\ndata: {{}}\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next_event(EVENTS_HEARTBEAT_SECONDS)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {event.id}\nevent: {event.type.value}\ndata: {event.model_dump_json()}\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-@router.post("/upload")
+# body is read by the handler, not FastAPI, so declare the form for the docs
+UPLOAD_REQUEST_BODY = {
+    "requestBody": {
+        "required": True,
+        "content": {"multipart/form-data": {"schema": {
+            "type": "object",
+            "required": ["file"],
+            "properties": {"file": {"type": "string", "format": "binary", "description": "File to upload"}}
+        }}}
+    }
+}
+
+@router.post("/upload", openapi_extra=UPLOAD_REQUEST_BODY)
 async def upload_file(
+    request: Request,
     path: str = Query("/", description="Destination to directory path"),
-    file: UploadFile = File(..., description="File to upload"),
+    content_length: Optional[int] = Header(None),
+    file_service: FileService = Depends(get_file_service),
+    current_user: dict = Depends(get_current_user)
+):
+    # multipart body is streamed so the upload is admitted before any of it is read
+    return await file_service.upload_file(
+        request.stream(), request.headers.get("content-type"), content_length, path, current_user
+    )
+
+@router.get("/signature", response_model=FileSignature)
+async def file_signature(
+    path: str = Query(..., description="File to sign"),
+    accept_encoding: Optional[str] = Header(None),
     file_service: FileService = Depends(get_file_service),
     current_user: dict = Depends(get_current_user)
 ):
-    return await file_service.upload_file(file, path, current_user)
+    # block signatures a sync client diffs its local copy against
+    signature = await file_service.file_signature(path, current_user)
+    return json_response(signature, accept_encoding=accept_encoding)
 
-@router.post("/mkdir")
+@router.post("/delta")
+async def apply_delta(
+    request: Request,
+    path: str = Query(..., description="File to update"),
+    base_version: str = Query(..., description="version from the signature the delta was built on"),
+    block_size: int = Query(..., ge=MIN_BLOCK_SIZE, le=MAX_BLOCK_SIZE, description="block_size from the signature"),
+    sha256: str = Query(..., description="Expected sha256 of the rebuilt file, it only replaces the file if this matches"),
+    file_service: FileService = Depends(get_file_service),
+    current_user: dict = Depends(get_current_user)
+):
+    # body is the binary delta stream, see app.services.delta_sync
+    return await file_service.apply_delta(path, request.stream(), base_version, block_size, sha256, current_user)
+
+@router.post("/mkdir", dependencies=[Depends(interactive_request)])
 async def create_directory(
     path: str = Query(..., description="Parent directory path"),
     name: str = Query(..., description="New directory name"),
@@ -38,7 +158,7 @@ async def create_directory(
 ):
     return await file_service.create_directory(path, name, current_user)
 
-@router.delete("/delete")
+@router.delete("/delete", dependencies=[Depends(interactive_request)])
 async def delete_file(
     path: str = Query(..., description="File or directory path to delete"),
     file_service: FileService = Depends(get_file_service),
@@ -56,11 +176,21 @@ async def download_file(
     # URL decode
     filename = urllib.parse.unquote(target_path.name)
 
-    return FileResponse(
-        path=str(target_path),
-        filename=filename,
+    file_size = target_path.stat().st_size
+
+    transfer = await transfer_scheduler.admit(current_user["username"])
+    return StreamingResponse(
+        file_service.stream_file(target_path, transfer),
         media_type=mime_type,
         headers={
-            "Content-Disposition": f'attatchment; filename="{filename}"'
-        }
-    )
\ No newline at end of file
+            "Content-Disposition": f'attatchment; filename="{filename}"',
+            "Content-Length": str(file_size)
+        },
+        # release the slot even if the body is never iterated
+        background=BackgroundTask(transfer.release)
+    )
+
+@router.get("/transfers")
+async def transfer_status(current_user: dict = Depends(get_current_user)):
+    # queue and shaping state for this worker
+    return transfer_scheduler.snapshot(current_user["username"])
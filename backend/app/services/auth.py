@@ -1,17 +1,26 @@
-from passlib.context import CryptContext
-from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi import HTTPException, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.config import SECRET_KEY
 import logging
 import os
-
-# password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+import threading
 
 logger = logging.getLogger(__name__)
 
+# tickets for EventSource, which can't send headers and so puts them in the URL
+STREAM_TICKET_SECONDS = 60
+STREAM_SCOPE = "stream"
+
+_pwd_context = None
+
+# password hashing, passlib/bcrypt are only loaded on first login
+def get_pwd_context():
+    global _pwd_context
+    if _pwd_context is None:
+        from passlib.context import CryptContext
+        _pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+    return _pwd_context
+
 class AuthService:
     _instance = None
 
@@ -26,28 +35,52 @@ class AuthService:
         if self._initialized:
             return
         #TODO actually use DB for users
-        admin_password = os.getenv('ADMIN_PASSWORD', 'setupdb')
+        # passwords are bcrypt-hashed off the event loop after startup (or on
+        # first login if that comes first), never while importing
+        self._hash_lock = threading.Lock()
+        self._password_envs = {
+            "admin": ('ADMIN_PASSWORD', 'setupdb'),
+        }
         self.USERS = {
             "admin": {
                 "username": "admin",
-                "hashed_password": pwd_context.hash(admin_password),
+                "hashed_password": None,
                 "is_active": True,
-                "permissions": ["read", "write", "delete"],
+                "permissions": ["read", "write", "delete", "admin"],
             }
         }
         # demo user: no password required via special endpoint
         self.DEMO_USERNAME = "demo"
+        self._password_envs[self.DEMO_USERNAME] = ('DEMO_PLACEHOLDER_PASSWORD', 'demo')
         self.USERS[self.DEMO_USERNAME] = {
             "username": self.DEMO_USERNAME,
-            "hashed_password": pwd_context.hash(os.getenv('DEMO_PLACEHOLDER_PASSWORD', 'demo')), 
+            "hashed_password": None,
             "is_active": True,
             "permissions": ["read", "write", "delete"],
         }
         self._initialized = True
 
     def verifyPassword(self, plain_password: str, hashed_password: str) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return get_pwd_context().verify(plain_password, hashed_password)
     
+    def _get_hashed_password(self, user: dict) -> str:
+        # blocking, a login racing the warm-up waits for it instead of hashing twice
+        if user["hashed_password"] is None:
+            with self._hash_lock:
+                if user["hashed_password"] is None:
+                    env_name, default = self._password_envs[user["username"]]
+                    user["hashed_password"] = get_pwd_context().hash(os.getenv(env_name, default))
+        return user["hashed_password"]
+
+    def prepare_password_hashes(self):
+        # run in a thread from the lifespan, so the first login only pays for a verify.
+        # demo signs in through /auth/demo, its placeholder hash stays lazy
+        try:
+            for username, user in self.USERS.items():
+                if username != self.DEMO_USERNAME:
+                    self._get_hashed_password(user)
+        except Exception as e:
+            logger.error(f"Password hashing failed: {e}")
 
     def authenticate_user(self, username: str, password: str):
         user = self.USERS.get(username)
@@ -56,7 +89,7 @@ class AuthService:
             logger.warning(f"Login attempt for non-existant user: {username}")
             return None
         
-        password_valid = self.verifyPassword(password, user["hashed_password"])
+        password_valid = self.verifyPassword(password, self._get_hashed_password(user))
     
         if not password_valid:
             return None
@@ -69,7 +102,7 @@ class AuthService:
         if not user:
             user = {
                 "username": self.DEMO_USERNAME,
-                "hashed_password": pwd_context.hash(os.getenv('DEMO_PLACEHOLDER_PASSWORD', 'demo')),
+                "hashed_password": None,
                 "is_active": True,
                 "permissions": ["read", "write", "delete"],
             }
@@ -78,12 +111,23 @@ class AuthService:
     
     @staticmethod
     def create_access_token(data: dict):
+        from jose import jwt
         to_encode = data.copy()
         expire = datetime.utcnow() + timedelta(minutes=30)
         to_encode.update({"exp": expire})
         return jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
 
-    def verify_token(self, token: str) -> dict:
+    @staticmethod
+    def create_stream_ticket(username: str):
+        # short lived and only accepted by streaming endpoints, so one leaked
+        # from a URL (logs, history) can't be used as a bearer token
+        from jose import jwt
+        expire = datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+        to_encode = {"sub": username, "scope": STREAM_SCOPE, "exp": expire}
+        return jwt.encode(to_encode, SECRET_KEY, algorithm="HS256")
+
+    def verify_token(self, token: str, scope: str = None) -> dict:
+        from jose import jwt, JWTError
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
@@ -96,6 +140,9 @@ class AuthService:
 
             if username is None:
                 raise credentials_exception
+            # access tokens carry no scope, tickets only work where asked for
+            if payload.get("scope") != scope:
+                raise credentials_exception
 
             # check if user still exists
             user = self.USERS.get(username)
@@ -0,0 +1,213 @@
+import asyncio
+import importlib
+import logging
+import secrets
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, Optional, Set, Tuple
+
+from app.config import STAGING_DIR
+from app.models.events import ChangeEvent, ChangeType
+
+logger = logging.getLogger(__name__)
+
+# where a change was noticed
+SOURCE_API = "api"
+SOURCE_WATCHER = "watcher"
+
+
+class Subscription:
+    """one connected client listening on a single directory"""
+
+    def __init__(self, path: str, queue_size: int):
+        self.path = path
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+    def offer(self, event: ChangeEvent, resync: ChangeEvent):
+        # never block the publisher: a client that can't keep up gets one
+        # resync instead of an ever-growing backlog
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(resync)
+
+    async def next_event(self, timeout: float) -> Optional[ChangeEvent]:
+        try:
+            event = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if event.type == ChangeType.RESYNC:
+            self.overflowed = False
+        return event
+
+
+class ChangeFeed:
+    """
+    In-process change notifications, per worker. Events are keyed by the
+    storage-relative directory they happened in and coalesced over a short
+    window so a burst of writes reaches clients as one event per entry.
+    """
+
+    def __init__(self, history_size: int = 1024, queue_size: int = 256,
+                 coalesce_seconds: float = 0.25, dedup_seconds: float = 2.0):
+        # the epoch makes resume tokens from another worker or a previous run stale
+        self.epoch = secrets.token_hex(4)
+        self.queue_size = queue_size
+        self.coalesce_seconds = coalesce_seconds
+        self.dedup_seconds = dedup_seconds
+
+        self._seq = 0
+        self._history: Deque[Tuple[int, ChangeEvent]] = deque(maxlen=history_size)
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self._pending: Dict[Tuple[str, str], ChangeType] = {}
+        # last time the API itself reported an entry, to drop the watcher's echo
+        self._api_seen: Dict[Tuple[str, str], float] = {}
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        # bumped on every change inside a directory or one of its subdirectories,
+        # a listing shows its subdirectories' mtimes so those count too
+        self._versions: Dict[str, int] = defaultdict(int)
+
+    @property
+    def token(self) -> str:
+        return f"{self.epoch}-{self._seq}"
+
+    def directory_version(self, path: str) -> str:
+        # with the epoch, so counters from another worker or run never match
+        return f"{self.epoch}.{self._versions.get(path, 0)}"
+
+    def _bump(self, path: str):
+        self._versions[path] += 1
+        if path != "/":
+            self._versions[path.rsplit("/", 1)[0] or "/"] += 1
+
+    def _resync_event(self, path: str) -> ChangeEvent:
+        return ChangeEvent(id=self.token, type=ChangeType.RESYNC, path=path, name="")
+
+    @staticmethod
+    def _merge(existing: Optional[ChangeType], new: ChangeType) -> ChangeType:
+        if existing is None or new == ChangeType.DELETED:
+            return new
+        if existing == ChangeType.DELETED:
+            # deleted then recreated inside the window
+            return ChangeType.MODIFIED
+        if existing == ChangeType.CREATED:
+            return ChangeType.CREATED
+        return new
+
+    def publish(self, change_type: ChangeType, path: str, name: str, source: str = SOURCE_API):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # called from a worker thread, the storage watcher will pick it up
+            return
+
+        # every sighting counts, including watcher echoes of API writes
+        self._bump(path)
+
+        key = (path, name)
+        now = time.monotonic()
+        if source == SOURCE_API:
+            self._api_seen[key] = now
+        elif now - self._api_seen.get(key, float("-inf")) < self.dedup_seconds:
+            return
+
+        self._pending[key] = self._merge(self._pending.get(key), change_type)
+        if self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.coalesce_seconds, self._flush)
+
+    def _flush(self):
+        self._flush_handle = None
+        pending, self._pending = self._pending, {}
+
+        for (path, name), change_type in pending.items():
+            self._seq += 1
+            event = ChangeEvent(id=self.token, type=change_type, path=path, name=name)
+            self._history.append((self._seq, event))
+            subscribers = self._subscribers.get(path)
+            if subscribers:
+                resync = self._resync_event(path)
+                for subscription in subscribers:
+                    subscription.offer(event, resync)
+
+        cutoff = time.monotonic() - self.dedup_seconds
+        self._api_seen = {key: seen for key, seen in self._api_seen.items() if seen >= cutoff}
+
+    def _parse_token(self, token: str) -> Optional[int]:
+        epoch, _, seq = token.rpartition("-")
+        if epoch != self.epoch:
+            return None
+        try:
+            seq = int(seq)
+        except ValueError:
+            return None
+        if seq > self._seq:
+            return None
+        # history must still hold everything after seq
+        if seq < self._seq and (not self._history or self._history[0][0] > seq + 1):
+            return None
+        return seq
+
+    def subscribe(self, path: str, resume_token: Optional[str] = None) -> Subscription:
+        subscription = Subscription(path, self.queue_size)
+        self._subscribers[path].add(subscription)
+
+        if resume_token:
+            seq = self._parse_token(resume_token)
+            if seq is None:
+                subscription.offer(self._resync_event(path), self._resync_event(path))
+            else:
+                resync = self._resync_event(path)
+                for event_seq, event in self._history:
+                    if event_seq > seq and event.path == path:
+                        subscription.offer(event, resync)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.path)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.path]
+
+    async def watch(self, root: Path, stop_event: asyncio.Event):
+        # out-of-band changes (shell, rsync, other workers) via inotify;
+        # imported off the event loop so the first requests aren't held up
+        try:
+            watchfiles = await asyncio.to_thread(importlib.import_module, "watchfiles")
+        except ImportError:
+            logger.warning("watchfiles not installed, only API changes will be published")
+            return
+        awatch, Change = watchfiles.awatch, watchfiles.Change
+
+        change_types = {
+            Change.added: ChangeType.CREATED,
+            Change.modified: ChangeType.MODIFIED,
+            Change.deleted: ChangeType.DELETED,
+        }
+        root = root.resolve()
+        try:
+            async for changes in awatch(root, stop_event=stop_event, debounce=200):
+                for change, raw_path in changes:
+                    try:
+                        relative = Path(raw_path).relative_to(root)
+                    except ValueError:
+                        continue
+                    # in-flight writes, they show up once moved into place
+                    if STAGING_DIR in relative.parts:
+                        continue
+                    parent = relative.parent.as_posix()
+                    parent = "/" if parent == "." else f"/{parent}"
+                    self.publish(change_types[change], parent, relative.name, source=SOURCE_WATCHER)
+        except Exception as e:
+            logger.error(f"Storage watcher stopped: {e}")
+
+
+change_feed = ChangeFeed()
@@ -0,0 +1,308 @@
+"""
+rsync-style delta transfer.
+
+The server publishes per-block signatures of the file it has (a weak
+adler32 that can be rolled one byte at a time plus a strong blake2b),
+the client scans its new version for blocks the server already has and
+sends a delta of block references and literal bytes, and the server
+rebuilds the file from its old copy plus the literals.
+
+Delta wire format, all integers big-endian:
+    b"PCD1"                              magic
+    b"C" + u64 first_block + u32 count   copy a run of existing blocks
+    b"L" + u32 length + bytes            literal data
+    b"E"                                 end of delta
+"""
+import hashlib
+import math
+import struct
+import zlib
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterator, List, Optional
+
+MAGIC = b"PCD1"
+OP_COPY = b"C"
+OP_LITERAL = b"L"
+OP_END = b"E"
+_COPY = struct.Struct(">QI")
+_LITERAL = struct.Struct(">I")
+
+MIN_BLOCK_SIZE = 4 * 1024
+MAX_BLOCK_SIZE = 1024 * 1024
+# encoder splits literal runs at this size, the decoder refuses anything larger
+MAX_LITERAL = 1024 * 1024
+READ_SIZE = 4 * 1024 * 1024
+
+ADLER_MOD = 65521
+
+
+class DeltaError(ValueError):
+    """malformed or inapplicable delta"""
+
+
+def choose_block_size(size: int) -> int:
+    # ~sqrt(size) like rsync, rounded to a power of two
+    if size <= MIN_BLOCK_SIZE * MIN_BLOCK_SIZE:
+        return MIN_BLOCK_SIZE
+    block_size = 1 << (math.isqrt(size) - 1).bit_length()
+    return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, block_size))
+
+
+def strong_checksum(data) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def file_signature(path: Path, block_size: Optional[int] = None) -> dict:
+    size = path.stat().st_size
+    block_size = block_size or choose_block_size(size)
+    weak: List[int] = []
+    strong: List[str] = []
+    with open(path, "rb") as f:
+        while block := f.read(block_size):
+            weak.append(zlib.adler32(block))
+            strong.append(strong_checksum(block))
+    return {
+        "block_size": block_size,
+        "size": size,
+        "weak": weak,
+        "strong": strong,
+    }
+
+
+class _OpWriter:
+    """
+    Turns matched blocks and literal bytes into ops in file order. Copy runs
+    of consecutive blocks are merged and literal runs are cut at
+    MAX_LITERAL; at most one of the two is pending at any time.
+    """
+
+    def __init__(self):
+        self.run_start = -1
+        self.run_count = 0
+        self.pending = bytearray()
+
+    @property
+    def next_block(self) -> int:
+        return self.run_start + self.run_count if self.run_count else -1
+
+    def _flush_run(self) -> List[bytes]:
+        if not self.run_count:
+            return []
+        op = OP_COPY + _COPY.pack(self.run_start, self.run_count)
+        self.run_start, self.run_count = -1, 0
+        return [op]
+
+    def _flush_literal(self) -> List[bytes]:
+        if not self.pending:
+            return []
+        op = OP_LITERAL + _LITERAL.pack(len(self.pending)) + bytes(self.pending)
+        self.pending = bytearray()
+        return [op]
+
+    def copy(self, block: int) -> List[bytes]:
+        ops = self._flush_literal()
+        if block == self.next_block:
+            self.run_count += 1
+        else:
+            ops += self._flush_run()
+            self.run_start, self.run_count = block, 1
+        return ops
+
+    def literal(self, data) -> List[bytes]:
+        if not len(data):
+            return []
+        ops = self._flush_run()
+        self.pending += data
+        while len(self.pending) >= MAX_LITERAL:
+            ops.append(OP_LITERAL + _LITERAL.pack(MAX_LITERAL) + bytes(self.pending[:MAX_LITERAL]))
+            del self.pending[:MAX_LITERAL]
+        return ops
+
+    def close(self) -> List[bytes]:
+        return self._flush_literal() + self._flush_run()
+
+
+def encode_delta(signature: dict, new_file: BinaryIO) -> Iterator[bytes]:
+    """client side: yield delta ops turning the signed file into new_file"""
+    block_size = signature["block_size"]
+    weak_sums = signature["weak"]
+    strong_sums = signature["strong"]
+    block_count = len(weak_sums)
+    tail_size = signature["size"] - (block_count - 1) * block_size if block_count else 0
+
+    index: Dict[int, List[int]] = {}
+    for block, weak in enumerate(weak_sums):
+        index.setdefault(weak, []).append(block)
+
+    ops = _OpWriter()
+
+    def match(window, weak: int) -> int:
+        candidates = index.get(weak)
+        if not candidates:
+            return -1
+        digest = strong_checksum(window)
+        # prefer extending the current run
+        if ops.next_block in candidates and strong_sums[ops.next_block] == digest:
+            return ops.next_block
+        for block in candidates:
+            if strong_sums[block] == digest:
+                return block
+        return -1
+
+    yield MAGIC
+    buf = b""
+    pos = lit_start = 0
+    eof = False
+    weak = a = b = None
+
+    while True:
+        # keep a full block ahead of pos; the rolling sum survives the rebase
+        if len(buf) - pos < block_size and not eof:
+            chunk = new_file.read(READ_SIZE)
+            if chunk:
+                yield from ops.literal(memoryview(buf)[lit_start:pos])
+                buf = buf[pos:] + chunk
+                pos = lit_start = 0
+                continue
+            eof = True
+        if len(buf) - pos < block_size:
+            break
+
+        window = memoryview(buf)[pos:pos + block_size]
+        if weak is None:
+            weak = zlib.adler32(window)
+            a, b = weak & 0xFFFF, weak >> 16
+
+        block = match(window, weak)
+        if block >= 0:
+            yield from ops.literal(memoryview(buf)[lit_start:pos])
+            yield from ops.copy(block)
+            pos += block_size
+            lit_start = pos
+            weak = None
+            continue
+
+        # no match: slide the window one byte
+        if pos + block_size < len(buf):
+            out_byte, in_byte = buf[pos], buf[pos + block_size]
+            a = (a - out_byte + in_byte) % ADLER_MOD
+            b = (b - block_size * out_byte + a - 1) % ADLER_MOD
+            weak = (b << 16) | a
+        else:
+            weak = None
+        pos += 1
+        if pos - lit_start >= MAX_LITERAL:
+            yield from ops.literal(memoryview(buf)[lit_start:pos])
+            lit_start = pos
+
+    # the old file's short last block can only match right at the end
+    tail = memoryview(buf)[pos:]
+    if (block_count and len(tail) == tail_size < block_size
+            and zlib.adler32(tail) == weak_sums[-1]
+            and strong_checksum(tail) == strong_sums[-1]):
+        yield from ops.literal(memoryview(buf)[lit_start:pos])
+        yield from ops.copy(block_count - 1)
+    else:
+        yield from ops.literal(memoryview(buf)[lit_start:])
+    yield from ops.close()
+    yield OP_END
+
+
+class DeltaApplier:
+    """
+    Server side push parser: feed() delta bytes as they arrive, the new
+    file is written to out as ops complete. Blocking I/O, run it off the
+    event loop.
+    """
+
+    def __init__(self, base: BinaryIO, out: BinaryIO, block_size: int,
+                 base_size: int, max_size: Optional[int] = None):
+        self.base = base
+        self.out = out
+        self.block_size = block_size
+        self.base_size = base_size
+        self.block_count = math.ceil(base_size / block_size) if block_size else 0
+        self.max_size = max_size
+
+        self.digest = hashlib.sha256()
+        self.written = 0
+        self.copied_bytes = 0
+        self.literal_bytes = 0
+        self.finished = False
+        self._buffer = bytearray()
+        self._started = False
+
+    def feed(self, data: bytes):
+        if self.finished:
+            if data:
+                raise DeltaError("Data after end of delta")
+            return
+        self._buffer += data
+        self._parse()
+
+    def _parse(self):
+        buf = self._buffer
+        offset = 0
+        if not self._started:
+            if len(buf) < len(MAGIC):
+                return
+            if bytes(buf[:len(MAGIC)]) != MAGIC:
+                raise DeltaError("Not a delta stream")
+            offset = len(MAGIC)
+            self._started = True
+
+        while offset < len(buf):
+            op = bytes(buf[offset:offset + 1])
+            if op == OP_END:
+                offset += 1
+                self.finished = True
+                if offset != len(buf):
+                    raise DeltaError("Data after end of delta")
+                break
+            elif op == OP_COPY:
+                if len(buf) - offset - 1 < _COPY.size:
+                    break
+                first, count = _COPY.unpack_from(buf, offset + 1)
+                offset += 1 + _COPY.size
+                self._copy(first, count)
+            elif op == OP_LITERAL:
+                if len(buf) - offset - 1 < _LITERAL.size:
+                    break
+                (length,) = _LITERAL.unpack_from(buf, offset + 1)
+                if length > MAX_LITERAL:
+                    raise DeltaError("Literal too large")
+                end = offset + 1 + _LITERAL.size + length
+                if len(buf) < end:
+                    break
+                self._write(buf[offset + 1 + _LITERAL.size:end])
+                self.literal_bytes += length
+                offset = end
+            else:
+                raise DeltaError("Unknown delta op")
+        del buf[:offset]
+
+    def _copy(self, first: int, count: int):
+        if count == 0 or first + count > self.block_count:
+            raise DeltaError("Block reference out of range")
+        start = first * self.block_size
+        remaining = min((first + count) * self.block_size, self.base_size) - start
+        self.base.seek(start)
+        while remaining:
+            data = self.base.read(min(remaining, READ_SIZE))
+            if not data:
+                raise DeltaError("Base file changed while applying delta")
+            self._write(data)
+            self.copied_bytes += len(data)
+            remaining -= len(data)
+
+    def _write(self, data):
+        self.written += len(data)
+        if self.max_size is not None and self.written > self.max_size:
+            raise DeltaError("Result exceeds maximum file size")
+        self.digest.update(data)
+        self.out.write(data)
+
+    def finish(self) -> str:
+        if not self.finished or self._buffer:
+            raise DeltaError("Truncated delta")
+        return self.digest.hexdigest()
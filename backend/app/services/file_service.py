@@ -1,36 +1,66 @@
 import os
+import stat
 import shutil
+import time
+import uuid
+import zlib
 import mimetypes
 from pathlib import Path
 from datetime import datetime, timedelta
-from fastapi import HTTPException, UploadFile
+from fastapi import HTTPException
+from anyio import from_thread
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pathvalidate import is_valid_filename
 import aiofiles
-from typing import Tuple
+from typing import AsyncIterator, Callable, Iterator, Optional, Tuple
+import orjson
 
-from app.config import STORAGE_PATH, MAX_FILE_SIZE
-from app.models.files import FileItem, FileType, DirectoryListing
+from app.config import STORAGE_PATH, MAX_FILE_SIZE, TRANSFER_CHUNK_SIZE, STAGING_DIR
+from app.models.files import FileType
+from app.models.events import ChangeType
+from app.services.change_feed import change_feed
+from app.services.transfers import transfer_scheduler, Transfer
+from app.services import delta_sync
+from app.services.delta_sync import DeltaApplier, DeltaError
+from app.services.hash_cache import hash_cache
 from app.utils.exceptions import FileNotFoundError, InvalidPathError
+from app.utils.uploads import MultipartFileReader
+from app.middleware.timing import timed
+
+# bytes of NDJSON per chunk handed to the response
+TREE_BATCH_SIZE = 64 * 1024
+TREE_SINCE_MARGIN_SECONDS = 1.0
+# allowance for multipart framing when checking an upload's Content-Length
+MULTIPART_OVERHEAD = 64 * 1024
 
 class FileService:
     def __init__(self):
+        # built per request, so no filesystem work here
         self.storage_path = Path(STORAGE_PATH)
-        # make sure storage dir exists
-        self.storage_path.mkdir(parents=True, exist_ok=True)
         # demo uploads live under /demo
         self.demo_root = self.storage_path / 'demo'
+        # partial writes, hidden from listings and the change feed
+        self.staging_root = self.storage_path / STAGING_DIR
+
+    def ensure_storage(self):
+        # make sure storage dirs exist, run once at startup
+        self.storage_path.mkdir(parents=True, exist_ok=True)
         self.demo_root.mkdir(parents=True, exist_ok=True)
+        self.staging_root.mkdir(parents=True, exist_ok=True)
 
     def _get_safe_path(self, path: str) -> str:
         # normalize paths
         clean_path = path.lstrip('/')
         full_path = self.storage_path / clean_path
+        if STAGING_DIR in Path(clean_path).parts:
+            raise InvalidPathError(path)
 
         # confirm path is within storage
-        try:
-            full_path.resolve().relative_to(self.storage_path.resolve())
-        except:
-            raise InvalidPathError(path)
+        with timed("path"):
+            try:
+                full_path.resolve().relative_to(self.storage_path.resolve())
+            except:
+                raise InvalidPathError(path)
         
         return full_path
     
@@ -44,67 +74,227 @@ class FileService:
                     return f"/demo{path}"
         return path
     
-    async def list_directory(self, path: str = "/", current_user: dict = None) -> DirectoryListing:
+    def _storage_key(self, full_path: Path) -> str:
+        # "/a/b" form used by the change feed, independent of how the path was spelled
+        relative = full_path.resolve().relative_to(self.storage_path.resolve()).as_posix()
+        return "/" if relative == "." else f"/{relative}"
+
+    def _publish_change(self, change_type: ChangeType, full_path: Path):
+        change_feed.publish(change_type, self._storage_key(full_path.parent), full_path.name)
+
+    def change_feed_path(self, path: str = "/", current_user: dict = None) -> str:
+        # directory key a client subscribes to, validated like a listing
+        _, dir_path, _ = self._resolve_directory(path, current_user)
+        return self._storage_key(dir_path)
+
+    def _resolve_directory(self, path: str, current_user: dict = None) -> Tuple[str, Path, os.stat_result]:
         user_path = self._get_user_path(path, current_user)
         dir_path = self._get_safe_path(user_path)
 
-        if not dir_path.exists():
+        try:
+            with timed("fs"):
+                dir_stat = dir_path.stat()
+        except OSError:
             raise FileNotFoundError(user_path)
-        if not dir_path.is_dir():
+        if not stat.S_ISDIR(dir_stat.st_mode):
             raise InvalidPathError(f"{user_path} is not a directory.")
-        
-        # collect all children
+
+        return user_path, dir_path, dir_stat
+
+    def directory_etag(self, path: str = "/", current_user: dict = None) -> str:
+        # weak validator, no entries are read. the directory's own inode/mtime
+        # cover entries being added, removed or renamed; the change feed version
+        # covers what the mtime misses: in-place rewrites of a child and changes
+        # inside a subdirectory, whose modified time the listing shows. changes
+        # the feed never sees (WATCH_STORAGE off, edits outside the API) can
+        # still be served stale
+        _, dir_path, dir_stat = self._resolve_directory(path, current_user)
+        version = change_feed.directory_version(self._storage_key(dir_path))
+        path_tag = zlib.crc32(path.encode("utf-8"))
+        return f'W/"{dir_stat.st_ino:x}-{dir_stat.st_mtime_ns:x}-{version}-{path_tag:x}"'
+
+    async def list_directory_payload(self, path: str = "/", current_user: dict = None) -> dict:
+        # same shape as DirectoryListing but as plain dicts, skips model validation
+        user_path, dir_path, _ = self._resolve_directory(path, current_user)
+
+        # collect all children, one stat() per entry
         items = []
-        for item in dir_path.iterdir():
-            stat = item.stat()
-            file_item = FileItem(
-                name=item.name,
-                path=f"{path.rstrip('/')}/{item.name}",
-                type=FileType.DIRECTORY if item.is_dir() else FileType.FILE,
-                size=stat.st_size if item.is_file() else None,
-                modified=datetime.fromtimestamp(stat.st_mtime)
-            )
-            items.append(file_item)
+        with timed("fs"), os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.name == STAGING_DIR:
+                    continue
+                entry_stat = entry.stat()
+                is_dir = stat.S_ISDIR(entry_stat.st_mode)
+                items.append({
+                    "name": entry.name,
+                    "path": f"{path.rstrip('/')}/{entry.name}",
+                    "type": FileType.DIRECTORY.value if is_dir else FileType.FILE.value,
+                    "size": entry_stat.st_size if stat.S_ISREG(entry_stat.st_mode) else None,
+                    "modified": datetime.fromtimestamp(entry_stat.st_mtime),
+                })
         # sort w/ directories first
-        items.sort(key=lambda x: (x.type != FileType.DIRECTORY, x.name.lower()))
-        
-        return DirectoryListing(
-            path=user_path,
-            items=items,
-            total_items=len(items)
-        )
+        items.sort(key=lambda x: (x["type"] != FileType.DIRECTORY.value, x["name"].lower()))
+
+        return {
+            "path": user_path,
+            "items": items,
+            "total_items": len(items)
+        }
+
+    def tree_manifest(self, path: str = "/", current_user: dict = None, since: Optional[float] = None,
+                      with_hash: bool = False, transfer: Optional[Transfer] = None):
+        # validate up front so errors become proper responses, then stream
+        _, dir_path, _ = self._resolve_directory(path, current_user)
+        since_ns = int(since * 1e9) if since is not None else None
+        if transfer is None:
+            return self._walk_tree(dir_path, path.rstrip('/'), since_ns, with_hash)
+
+        # hashing reads file contents, shape them like any other transfer. the walk
+        # runs in the threadpool, so hop back to the event loop to throttle
+        def on_read(amount: int):
+            from_thread.run(transfer.throttle, amount)
+
+        walk = self._walk_tree(dir_path, path.rstrip('/'), since_ns, with_hash, on_read)
+        return self._shaped_tree(walk, transfer)
+
+    @staticmethod
+    async def _shaped_tree(walk: Iterator[bytes], transfer: Transfer) -> AsyncIterator[bytes]:
+        try:
+            async for chunk in iterate_in_threadpool(walk):
+                yield chunk
+        finally:
+            transfer.release()
+
+    def _walk_tree(self, root: Path, prefix: str, since_ns: Optional[int], with_hash: bool,
+                   on_read: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+        # NDJSON, one line per entry, batched so the threadpool isn't hit per line.
+        # iterative walk over open scandir handles, memory grows with depth only
+        # filesystem timestamps come from a coarse clock, step back so nothing is missed
+        started = time.time() - TREE_SINCE_MARGIN_SECONDS
+        batch = bytearray()
+        stack = [(os.scandir(root), prefix)]
+        try:
+            while stack:
+                entries, parent = stack[-1]
+                entry = next(entries, None)
+                if entry is None:
+                    entries.close()
+                    stack.pop()
+                    continue
+
+                # never follow links out of the tree
+                if entry.is_symlink() or entry.name == STAGING_DIR:
+                    continue
+                try:
+                    entry_stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                item_path = f"{parent}/{entry.name}"
+                is_dir = stat.S_ISDIR(entry_stat.st_mode)
+                if is_dir:
+                    try:
+                        stack.append((os.scandir(entry.path), item_path))
+                    except OSError:
+                        pass
+
+                # ctime too, so files moved in with an old mtime still show up
+                if since_ns is not None and max(entry_stat.st_mtime_ns, entry_stat.st_ctime_ns) <= since_ns:
+                    continue
+
+                record = {
+                    "path": item_path,
+                    "type": FileType.DIRECTORY.value if is_dir else FileType.FILE.value,
+                    "size": None if is_dir else entry_stat.st_size,
+                    "mtime": entry_stat.st_mtime,
+                }
+                if with_hash and not is_dir:
+                    try:
+                        record["sha256"] = hash_cache.sha256(entry.path, entry_stat, on_read)
+                    except OSError:
+                        record["sha256"] = None
+                batch += orjson.dumps(record)
+                batch += b"\n"
+                if len(batch) >= TREE_BATCH_SIZE:
+                    yield bytes(batch)
+                    batch.clear()
+
+            # pass back as since= to get only what changed after this walk started
+            batch += orjson.dumps({"type": "end", "since": started})
+            batch += b"\n"
+            yield bytes(batch)
+        finally:
+            for entries, _ in stack:
+                entries.close()
+
+    def _staging_file(self) -> Path:
+        # same filesystem as the destination, so the final os.replace is a rename
+        return self.staging_root / f"{uuid.uuid4().hex}.part"
 
-    async def upload_file(self, file: UploadFile, destination_path: str = "/", current_user: dict = None):
+    @staticmethod
+    def _unique_destination(dest_dir: Path, filename: str) -> Path:
+        # confirm unique name
+        dest_file = dest_dir / filename
+        if dest_file.exists():
+            base_name = dest_file.stem
+            extension = dest_file.suffix # '.pdf'
+            counter = 1
+            while dest_file.exists():
+                dest_file = dest_dir / f"{base_name}_{counter}{extension}"
+                counter += 1
+        return dest_file
+
+    @staticmethod
+    def _check_upload_name(filename: str) -> str:
+        if not filename or not is_valid_filename(filename) or filename == STAGING_DIR:
+            raise HTTPException(status_code=400, detail="Invalid filename")
+        return filename
+
+    async def upload_file(self, chunks: AsyncIterator[bytes], content_type: Optional[str],
+                          content_length: Optional[int] = None, destination_path: str = "/",
+                          current_user: dict = None):
+        # chunks is the raw multipart body, consumed only once the upload is admitted
         try:
-            if file.size and file.size > MAX_FILE_SIZE:
+            if content_length and content_length > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
                 # payload too large
                 raise HTTPException(status_code=413, detail="File too large to upload")
-            if not file.filename or not is_valid_filename(file.filename):
-                raise HTTPException(status_code=400, detail="Invalid filename")
-            
+            reader = MultipartFileReader(content_type)
+
             # get user-specific path and set destination
             user_path = self._get_user_path(destination_path, current_user)
             dest_dir = self._get_safe_path(user_path)
             if not dest_dir.exists():
                 dest_dir.mkdir(parents=True, exist_ok=True)
-            dest_file = dest_dir / file.filename
-
-            # confirm unique name
-            if dest_file.exists():
-                base_name = dest_file.stem
-                extension = dest_file.suffix # '.pdf'
-                counter = 1
-                while dest_file.exists():
-                    dest_file = dest_dir / f"{base_name}_{counter}{extension}"
-                    counter += 1
-
-            # write file 
-            async with aiofiles.open(dest_file, 'wb') as f:
-                content = await file.read()
-                await f.write(content)
+
+            # write file in shaped chunks to staging, then move it into place in one
+            # step so listings (and their ETag) only ever see the finished file.
+            # pacing the reads is what pushes back on the client's connection
+            staged = self._staging_file()
+            transfer = await transfer_scheduler.admit(current_user["username"] if current_user else "")
+            try:
+                filename = None
+                written = 0
+                async with aiofiles.open(staged, 'xb') as f:
+                    async for chunk in chunks:
+                        await transfer.throttle(len(chunk))
+                        data = reader.feed(chunk)
+                        if filename is None and reader.filename is not None:
+                            filename = self._check_upload_name(reader.filename)
+                        for piece in data:
+                            written += len(piece)
+                            if written > MAX_FILE_SIZE:
+                                raise HTTPException(status_code=413, detail="File too large to upload")
+                            with timed("fs"):
+                                await f.write(piece)
+                reader.finish()
+                dest_file = self._unique_destination(dest_dir, filename)
+                os.replace(staged, dest_file)
+            finally:
+                transfer.release()
+                staged.unlink(missing_ok=True)
 
             # get uploaded size
             file_stat = dest_file.stat()
+            self._publish_change(ChangeType.CREATED, dest_file)
 
             return {
                 "message": 'File uploaded successfully',
@@ -126,12 +316,14 @@ class FileService:
             parent_dir = self._get_safe_path(user_path)
             new_dir = parent_dir / name
             
-            if not is_valid_filename(name):
+            if not is_valid_filename(name) or name == STAGING_DIR:
                 raise HTTPException(status_code=400, detail="Invalid directory name")
             if new_dir.exists():
                 raise HTTPException(status_code=409, detail="Directory already exists")
             
-            new_dir.mkdir(parents=True, exist_ok=True)
+            with timed("fs"):
+                new_dir.mkdir(parents=True, exist_ok=True)
+            self._publish_change(ChangeType.CREATED, new_dir)
 
             return {
                 "message": "Directory successfully created",
@@ -150,12 +342,14 @@ class FileService:
             if not target_path.exists():
                 raise FileNotFoundError(user_path)
             
-            if target_path.is_dir():
-                shutil.rmtree(target_path)
-                message = "Directory successfully deleted"
-            else:
-                target_path.unlink()
-                message = "File deleted successfully"
+            with timed("fs"):
+                if target_path.is_dir():
+                    shutil.rmtree(target_path)
+                    message = "Directory successfully deleted"
+                else:
+                    target_path.unlink()
+                    message = "File deleted successfully"
+            self._publish_change(ChangeType.DELETED, target_path)
 
             return {"message": message, "path": user_path}
         
@@ -184,6 +378,121 @@ class FileService:
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Download failed: {str(e)}")
 
+    async def stream_file(self, target_path: Path, transfer: Transfer) -> AsyncIterator[bytes]:
+        # download body, shaped by the caller's admitted transfer
+        try:
+            async with aiofiles.open(target_path, 'rb') as f:
+                while chunk := await f.read(TRANSFER_CHUNK_SIZE):
+                    await transfer.throttle(len(chunk))
+                    yield chunk
+        finally:
+            transfer.release()
+
+    @staticmethod
+    def _file_version(file_stat: os.stat_result) -> str:
+        # what a delta was computed against
+        return f"{file_stat.st_size:x}-{file_stat.st_mtime_ns:x}"
+
+    def _get_sync_target(self, path: str, current_user: dict = None) -> Tuple[str, Path]:
+        user_path = self._get_user_path(path, current_user)
+        target_path = self._get_safe_path(user_path)
+        if not target_path.exists():
+            raise FileNotFoundError(user_path)
+        if target_path.is_dir():
+            raise HTTPException(status_code=400, detail="Cannot sync directories")
+        return user_path, target_path
+
+    async def file_signature(self, path: str, current_user: dict = None) -> dict:
+        try:
+            user_path, target_path = self._get_sync_target(path, current_user)
+            version = self._file_version(target_path.stat())
+            signature = await run_in_threadpool(delta_sync.file_signature, target_path)
+
+            return {"path": user_path, "version": version, **signature}
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Signature failed: {str(e)}")
+
+    @staticmethod
+    def _finish_delta(applier: DeltaApplier, out) -> str:
+        digest = applier.finish()
+        out.flush()
+        os.fsync(out.fileno())
+        return digest
+
+    async def apply_delta(self, path: str, chunks: AsyncIterator[bytes], base_version: str,
+                          block_size: int, sha256: str, current_user: dict = None) -> dict:
+        # rebuild in staging, then swap it in atomically
+        try:
+            user_path, target_path = self._get_sync_target(path, current_user)
+            base_stat = target_path.stat()
+            if self._file_version(base_stat) != base_version:
+                raise HTTPException(status_code=412, detail="File changed since signature was taken")
+            # block references only mean something at the size the signature used;
+            # the version doesn't cover it, so a mismatch would rebuild garbage
+            if block_size != delta_sync.choose_block_size(base_stat.st_size):
+                raise HTTPException(status_code=400, detail="block_size does not match the file's signature")
+
+            transfer = await transfer_scheduler.admit(current_user["username"] if current_user else "")
+            tmp_path = self._staging_file()
+            try:
+                # everything that can fail once admitted is inside here, so the slot is always released
+                with open(target_path, 'rb') as base, open(tmp_path, 'xb') as out:
+                    applier = DeltaApplier(base, out, block_size, base_stat.st_size, MAX_FILE_SIZE)
+                    async for chunk in chunks:
+                        await transfer.throttle(len(chunk))
+                        await run_in_threadpool(applier.feed, chunk)
+                    digest = await run_in_threadpool(self._finish_delta, applier, out)
+
+                if digest != sha256.lower():
+                    raise HTTPException(status_code=422, detail="Checksum mismatch after applying delta")
+                if self._file_version(target_path.stat()) != base_version:
+                    raise HTTPException(status_code=412, detail="File changed while applying delta")
+                shutil.copymode(target_path, tmp_path)
+                os.replace(tmp_path, target_path)
+            except DeltaError as e:
+                raise HTTPException(status_code=400, detail=f"Invalid delta: {str(e)}")
+            finally:
+                transfer.release()
+                tmp_path.unlink(missing_ok=True)
+
+            file_stat = target_path.stat()
+            self._publish_change(ChangeType.MODIFIED, target_path)
+
+            return {
+                "message": "File synced successfully",
+                "path": user_path,
+                "size": file_stat.st_size,
+                "version": self._file_version(file_stat),
+                "sha256": digest,
+                "copied_bytes": applier.copied_bytes,
+                "literal_bytes": applier.literal_bytes
+            }
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Delta sync failed: {str(e)}")
+
+    def cleanup_staging(self, max_age_hours: int = 1) -> int:
+        # staged files stop being written to when their upload or sync is interrupted
+        cutoff = time.time() - max_age_hours * 3600
+        deleted = 0
+        try:
+            entries = list(os.scandir(self.staging_root))
+        except OSError:
+            return 0
+        for entry in entries:
+            try:
+                if entry.stat().st_mtime < cutoff:
+                    os.unlink(entry.path)
+                    deleted += 1
+            except OSError:
+                continue
+        return deleted
+
     def cleanup_demo_uploads(self, max_age_hours: int = 2) -> int:
         cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
         deleted = 0
@@ -192,8 +501,8 @@ class FileService:
                 return 0
             for item in self.demo_root.rglob('*'):
                 try:
-                    stat = item.stat()
-                    modified = datetime.fromtimestamp(stat.st_mtime)
+                    item_stat = item.stat()
+                    modified = datetime.fromtimestamp(item_stat.st_mtime)
                     if modified < cutoff:
                         if item.is_dir():
                             shutil.rmtree(item, ignore_errors=True)
@@ -0,0 +1,53 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from app.config import HASH_CACHE_ENTRIES, TRANSFER_CHUNK_SIZE
+
+
+class HashCache:
+    """
+    LRU of file sha256s keyed by (device, inode, mtime, size), so a file is
+    only re-read after it changes. Shared by the threadpool, hence the lock.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[int, int, int, int], str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(file_stat: os.stat_result) -> Tuple[int, int, int, int]:
+        return (file_stat.st_dev, file_stat.st_ino, file_stat.st_mtime_ns, file_stat.st_size)
+
+    def sha256(self, path: str, file_stat: os.stat_result,
+               on_read: Optional[Callable[[int], None]] = None) -> str:
+        # on_read is called with each chunk's size before it is hashed, for shaping
+        key = self._key(file_stat)
+        with self._lock:
+            digest = self._entries.get(key)
+            if digest is not None:
+                self._entries.move_to_end(key)
+                return digest
+
+        with open(path, "rb") as f:
+            if on_read is None:
+                digest = hashlib.file_digest(f, "sha256").hexdigest()
+            else:
+                hasher = hashlib.sha256()
+                while chunk := f.read(TRANSFER_CHUNK_SIZE):
+                    on_read(len(chunk))
+                    hasher.update(chunk)
+                digest = hasher.hexdigest()
+
+        with self._lock:
+            self._entries[key] = digest
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return digest
+
+
+hash_cache = HashCache(HASH_CACHE_ENTRIES)
@@ -0,0 +1,211 @@
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional
+
+from app.config import SLOW_REQUEST_MS, PROFILE_INTERVAL_MS, PROFILE_MAX_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# stacks kept per slow request, deeper tails are merged into "other"
+MAX_SLOW_STACKS = 200
+SLOW_REQUEST_HISTORY = 20
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    filename = "/".join(code.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+
+
+def sample_stacks(skip_thread: Optional[int] = None) -> List[str]:
+    """one folded stack (root first, ';' separated) per live thread"""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        if ident == skip_thread:
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        labels.append(names.get(ident, f"thread-{ident}"))
+        stacks.append(";".join(reversed(labels)))
+    return stacks
+
+
+def folded(counts: Counter) -> str:
+    # flamegraph.pl / speedscope "collapsed stack" format
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class TrackedRequest:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stacks: Counter = Counter()
+        self.samples = 0
+
+
+class SlowRequestSampler:
+    """
+    Samples every thread's stack while some request has been running longer
+    than the threshold. The thread sleeps until the oldest request crosses
+    it, so there is no cost while requests are fast.
+    """
+
+    def __init__(self, threshold_ms: float, interval_ms: float):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval_ms / 1000
+        self.captures: Deque[dict] = deque(maxlen=SLOW_REQUEST_HISTORY)
+        self._requests: Dict[int, TrackedRequest] = {}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+
+    def track(self, method: str, path: str) -> TrackedRequest:
+        request = TrackedRequest(method, path)
+        with self._condition:
+            self._requests[id(request)] = request
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="slow-request-sampler", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return request
+
+    def pause(self, request: TrackedRequest):
+        # stop the clock while the request body is still arriving
+        with self._condition:
+            self._requests.pop(id(request), None)
+
+    def restart(self, request: TrackedRequest):
+        # body fully received, time the handling from here
+        with self._condition:
+            request.started = time.perf_counter()
+            request.stacks.clear()
+            request.samples = 0
+            self._requests[id(request)] = request
+            self._condition.notify()
+
+    def finish(self, request: TrackedRequest, phases: Dict[str, float]) -> float:
+        with self._condition:
+            tracked = self._requests.pop(id(request), None) is not None
+        elapsed = time.perf_counter() - request.started
+        # a paused request ended mid-body (client went away), nothing to report
+        if tracked and elapsed >= self.threshold:
+            breakdown = ", ".join(f"{name}={seconds * 1000:.1f}ms" for name, seconds in phases.items())
+            logger.warning(
+                f"Slow request {request.method} {request.path}: {elapsed * 1000:.0f}ms "
+                f"({breakdown or 'no phases'}), {request.samples} stack samples"
+            )
+            self.captures.append({
+                "method": request.method,
+                "path": request.path,
+                "duration_ms": round(elapsed * 1000, 1),
+                "phases_ms": {name: round(seconds * 1000, 2) for name, seconds in phases.items()},
+                "samples": request.samples,
+                "stacks": folded(request.stacks),
+            })
+        return elapsed
+
+    def _run(self):
+        me = threading.get_ident()
+        while True:
+            with self._condition:
+                now = time.perf_counter()
+                slow = [r for r in self._requests.values() if now - r.started >= self.threshold]
+                if not slow:
+                    if self._requests:
+                        oldest = min(r.started for r in self._requests.values())
+                        self._condition.wait(oldest + self.threshold - now)
+                    else:
+                        self._condition.wait()
+                    continue
+
+            stacks = sample_stacks(skip_thread=me)
+            with self._condition:
+                # all slow requests share the sample, the event loop can't tell them apart
+                for request in slow:
+                    if self._requests.get(id(request)) is not request:
+                        continue
+                    request.samples += 1
+                    for stack in stacks:
+                        if stack in request.stacks or len(request.stacks) < MAX_SLOW_STACKS:
+                            request.stacks[stack] += 1
+                        else:
+                            request.stacks["other"] += 1
+            time.sleep(self.interval)
+
+
+class ProfileSession:
+    """time-boxed sampling profile of this worker, all threads"""
+
+    def __init__(self, duration: float, interval_ms: float):
+        self.duration = min(duration, PROFILE_MAX_SECONDS)
+        self.interval = interval_ms / 1000
+        self.started = time.time()
+        self.finished: Optional[float] = None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @property
+    def running(self) -> bool:
+        return self.finished is None
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        me = threading.get_ident()
+        deadline = time.perf_counter() + self.duration
+        while not self._stop.is_set() and time.perf_counter() < deadline:
+            for stack in sample_stacks(skip_thread=me):
+                self.stacks[stack] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+        self.finished = time.time()
+
+    def status(self) -> dict:
+        return {
+            "pid": os.getpid(),
+            "running": self.running,
+            "started": self.started,
+            "finished": self.finished,
+            "duration": self.duration,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+        }
+
+
+class Profiler:
+    def __init__(self):
+        self.slow_requests = SlowRequestSampler(SLOW_REQUEST_MS, PROFILE_INTERVAL_MS)
+        self.session: Optional[ProfileSession] = None
+        self._lock = threading.Lock()
+
+    def start(self, duration: float, interval_ms: float) -> Optional[ProfileSession]:
+        # None if a profile is already running in this worker
+        with self._lock:
+            if self.session is not None and self.session.running:
+                return None
+            self.session = ProfileSession(duration, interval_ms)
+            self.session.start()
+            return self.session
+
+    def stop(self) -> Optional[ProfileSession]:
+        session = self.session
+        if session is not None and session.running:
+            session.stop()
+        return session
+
+
+profiler = Profiler()
@@ -0,0 +1,167 @@
+import asyncio
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from fastapi import HTTPException
+
+from app.config import (
+    TRANSFER_MAX_PER_USER,
+    TRANSFER_MAX_QUEUED_PER_USER,
+    TRANSFER_USER_RATE,
+    TRANSFER_GLOBAL_RATE,
+)
+
+# how long a bulk chunk may be held back while interactive requests run
+INTERACTIVE_GRACE_SECONDS = 0.05
+
+
+class TokenBucket:
+    """bytes/second limiter; a rate of 0 disables it"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst is not None else rate
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def consume(self, amount: int):
+        if self.rate <= 0:
+            return
+        # take the tokens now and sleep off any debt, so concurrent
+        # consumers queue up behind each other in order
+        self._refill()
+        self.tokens -= amount
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+
+class _UserState:
+    def __init__(self, max_active: int, rate: float):
+        self.slots = asyncio.Semaphore(max_active)
+        self.bucket = TokenBucket(rate)
+        self.active = 0
+        self.queued = 0
+        self.bytes = 0
+
+
+class Transfer:
+    """an admitted bulk transfer, call throttle() for every chunk moved"""
+
+    def __init__(self, scheduler: "TransferScheduler", username: str, state: _UserState):
+        self.scheduler = scheduler
+        self.username = username
+        self.state = state
+        self.bytes = 0
+        self._released = False
+
+    async def throttle(self, amount: int):
+        self.bytes += amount
+        self.state.bytes += amount
+        await self.scheduler._yield_to_interactive()
+        await self.state.bucket.consume(amount)
+        await self.scheduler.global_bucket.consume(amount)
+
+    def release(self):
+        # safe to call more than once (stream finally + background task)
+        if self._released:
+            return
+        self._released = True
+        self.state.active -= 1
+        self.state.slots.release()
+        self.scheduler._active -= 1
+
+
+class TransferScheduler:
+    """
+    Admission control and bandwidth shaping for uploads and downloads inside
+    one worker. Each user gets a few concurrent transfers and a short queue,
+    beyond that requests are refused with 429. Listing and other interactive
+    requests briefly pause bulk chunk loops so they stay responsive.
+    """
+
+    def __init__(self, max_per_user: int, max_queued_per_user: int,
+                 user_rate: float, global_rate: float):
+        self.max_per_user = max_per_user
+        self.max_queued_per_user = max_queued_per_user
+        self.user_rate = user_rate
+        self.global_bucket = TokenBucket(global_rate)
+
+        self._users: Dict[str, _UserState] = defaultdict(
+            lambda: _UserState(self.max_per_user, self.user_rate)
+        )
+        self._active = 0
+        self._interactive = 0
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+
+    async def admit(self, username: str) -> Transfer:
+        state = self._users[username]
+        if state.slots.locked() and state.queued >= self.max_queued_per_user:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many concurrent transfers",
+                headers={"Retry-After": "5"}
+            )
+
+        state.queued += 1
+        try:
+            await state.slots.acquire()
+        finally:
+            state.queued -= 1
+        state.active += 1
+        self._active += 1
+        return Transfer(self, username, state)
+
+    @asynccontextmanager
+    async def interactive(self):
+        self._interactive += 1
+        self._interactive_idle.clear()
+        try:
+            yield
+        finally:
+            self._interactive -= 1
+            if self._interactive == 0:
+                self._interactive_idle.set()
+
+    async def _yield_to_interactive(self):
+        if self._interactive == 0:
+            return
+        try:
+            await asyncio.wait_for(self._interactive_idle.wait(), INTERACTIVE_GRACE_SECONDS)
+        except asyncio.TimeoutError:
+            # don't starve bulk transfers under constant browsing
+            pass
+
+    def snapshot(self, username: Optional[str] = None) -> dict:
+        state = {
+            "active_transfers": self._active,
+            "queued_transfers": sum(user.queued for user in self._users.values()),
+            "interactive_in_flight": self._interactive,
+            "global_rate": self.global_bucket.rate,
+            "user_rate": self.user_rate,
+            "max_per_user": self.max_per_user,
+            "max_queued_per_user": self.max_queued_per_user,
+        }
+        if username is not None:
+            user = self._users.get(username)
+            state["user"] = {
+                "active": user.active if user else 0,
+                "queued": user.queued if user else 0,
+                "bytes_transferred": user.bytes if user else 0,
+            }
+        return state
+
+
+transfer_scheduler = TransferScheduler(
+    max_per_user=TRANSFER_MAX_PER_USER,
+    max_queued_per_user=TRANSFER_MAX_QUEUED_PER_USER,
+    user_rate=TRANSFER_USER_RATE,
+    global_rate=TRANSFER_GLOBAL_RATE,
+)
@@ -0,0 +1,68 @@
+import gzip
+from typing import Optional
+
+import orjson
+from fastapi import Response
+
+from app.middleware.timing import timed
+
+# payloads smaller than this aren't worth the CPU to compress
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 5
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # weak comparison as per RFC 9110, so W/"x" matches "x"
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    if not accept_encoding:
+        return False
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if coding.strip().lower() != "gzip":
+            continue
+        # honour an explicit "gzip;q=0" opt-out
+        name, _, value = params.strip().partition("=")
+        if name.strip().lower() == "q":
+            try:
+                return float(value) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def not_modified_response(etag: str, headers: Optional[dict] = None) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, **(headers or {})})
+
+
+def json_response(
+    content,
+    etag: Optional[str] = None,
+    accept_encoding: Optional[str] = None,
+    headers: Optional[dict] = None,
+) -> Response:
+    # serialize with orjson (handles datetimes natively) and gzip large bodies
+    with timed("serialize"):
+        body = orjson.dumps(content)
+        response_headers = {"Vary": "Accept-Encoding", **(headers or {})}
+        if etag:
+            response_headers["ETag"] = etag
+        if len(body) >= GZIP_MIN_SIZE and accepts_gzip(accept_encoding):
+            body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+            response_headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type="application/json", headers=response_headers)
@@ -0,0 +1,93 @@
+from typing import List, Optional
+
+from fastapi import HTTPException
+from multipart.exceptions import MultipartParseError
+from multipart.multipart import MultipartParser, parse_options_header
+
+
+def _decode(value: bytes) -> str:
+    try:
+        return value.decode("utf-8")
+    except UnicodeDecodeError:
+        return value.decode("latin-1")
+
+
+class MultipartFileReader:
+    """
+    Push parser for a multipart/form-data body carrying one file field.
+    feed() hands back that file's bytes as the body arrives, so an upload
+    can be admitted, shaped and written while it is received instead of
+    being spooled whole by the framework first. Other fields are ignored.
+    """
+
+    def __init__(self, content_type: Optional[str], field: str = "file"):
+        media_type, params = parse_options_header(content_type or "")
+        if media_type != b"multipart/form-data" or b"boundary" not in params:
+            raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+        self.field = field
+        self.filename: Optional[str] = None
+        self.complete = False
+
+        self._header_name = b""
+        self._header_value = b""
+        self._disposition = b""
+        self._in_file = False
+        self._data: List[bytes] = []
+        self._parser = MultipartParser(params[b"boundary"], callbacks={
+            "on_part_begin": self._on_part_begin,
+            "on_part_data": self._on_part_data,
+            "on_part_end": self._on_part_end,
+            "on_header_field": self._on_header_field,
+            "on_header_value": self._on_header_value,
+            "on_header_end": self._on_header_end,
+            "on_headers_finished": self._on_headers_finished,
+        })
+
+    def _on_part_begin(self):
+        self._disposition = b""
+        self._in_file = False
+
+    def _on_header_field(self, data: bytes, start: int, end: int):
+        self._header_name += data[start:end]
+
+    def _on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def _on_header_end(self):
+        if self._header_name.lower() == b"content-disposition":
+            self._disposition = self._header_value
+        self._header_name = b""
+        self._header_value = b""
+
+    def _on_headers_finished(self):
+        _, options = parse_options_header(self._disposition)
+        # only the first file under the expected field name is taken
+        if (self.filename is None and b"filename" in options
+                and _decode(options.get(b"name", b"")) == self.field):
+            self.filename = _decode(options[b"filename"])
+            self._in_file = True
+
+    def _on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file:
+            self._data.append(bytes(data[start:end]))
+
+    def _on_part_end(self):
+        if self._in_file:
+            self._in_file = False
+            self.complete = True
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """parse the next piece of the body, returns the file data it held"""
+        try:
+            self._parser.write(chunk)
+        except MultipartParseError as e:
+            raise HTTPException(status_code=400, detail=f"Malformed multipart body: {str(e)}")
+        data, self._data = self._data, []
+        return data
+
+    def finish(self):
+        if self.filename is None:
+            raise HTTPException(status_code=400, detail=f"No file in '{self.field}' field")
+        if not self.complete:
+            raise HTTPException(status_code=400, detail="Upload body ended before the file did")
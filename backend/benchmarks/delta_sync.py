@@ -0,0 +1,133 @@
+"""
+Delta sync benchmark: bytes on the wire and server CPU for small edits to
+a large file, compared with re-uploading it.
+
+Run from backend/:
+    python -m benchmarks.delta_sync --size-mb 2048 --edits 10
+"""
+import argparse
+import gzip
+import hashlib
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+import orjson
+
+from app.services.delta_sync import DeltaApplier, encode_delta, file_signature
+
+WRITE_CHUNK = 8 * 1024 * 1024
+
+
+def make_file(path: Path, size: int, seed: int):
+    rng = random.Random(seed)
+    with open(path, "wb") as f:
+        remaining = size
+        while remaining:
+            chunk = min(remaining, WRITE_CHUNK)
+            f.write(rng.randbytes(chunk))
+            remaining -= chunk
+
+
+def edit_copy(src: Path, dst: Path, edits: int, edit_size: int, insert: bool, seed: int):
+    # overwrite (or insert) edit_size bytes at a few random offsets
+    rng = random.Random(seed)
+    size = src.stat().st_size
+    offsets = sorted(rng.randrange(size) for _ in range(edits))
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        pos = 0
+        for offset in offsets:
+            while pos < offset:
+                data = fin.read(min(WRITE_CHUNK, offset - pos))
+                fout.write(data)
+                pos += len(data)
+            fout.write(rng.randbytes(edit_size))
+            if not insert:
+                fin.seek(edit_size, os.SEEK_CUR)
+                pos += edit_size
+        while data := fin.read(WRITE_CHUNK):
+            fout.write(data)
+
+
+def run(size: int, edits: int, edit_size: int, insert: bool, workdir: Path) -> dict:
+    old_path = workdir / "old.bin"
+    new_path = workdir / "new.bin"
+    out_path = workdir / "rebuilt.bin"
+    make_file(old_path, size, seed=1)
+    edit_copy(old_path, new_path, edits, edit_size, insert, seed=2)
+
+    # server: signature
+    cpu, wall = time.process_time(), time.perf_counter()
+    signature = file_signature(old_path)
+    signature_body = gzip.compress(orjson.dumps(signature), compresslevel=5)
+    sig_cpu, sig_wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    # client: delta
+    cpu, wall = time.process_time(), time.perf_counter()
+    with open(new_path, "rb") as f:
+        delta = b"".join(encode_delta(signature, f))
+    enc_cpu, enc_wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    # server: rebuild
+    cpu, wall = time.process_time(), time.perf_counter()
+    with open(old_path, "rb") as base, open(out_path, "wb") as out:
+        applier = DeltaApplier(base, out, signature["block_size"], signature["size"])
+        for start in range(0, len(delta), 64 * 1024):
+            applier.feed(delta[start:start + 64 * 1024])
+        digest = applier.finish()
+    apply_cpu, apply_wall = time.process_time() - cpu, time.perf_counter() - wall
+
+    with open(new_path, "rb") as f:
+        expected = hashlib.file_digest(f, "sha256").hexdigest()
+    if digest != expected:
+        raise SystemExit("rebuilt file does not match")
+
+    new_size = new_path.stat().st_size
+    return {
+        "file_bytes": new_size,
+        "block_size": signature["block_size"],
+        "signature_bytes": len(signature_body),
+        "delta_bytes": len(delta),
+        "literal_bytes": applier.literal_bytes,
+        "saved": 1 - (len(signature_body) + len(delta)) / new_size,
+        "server_signature_cpu": sig_cpu,
+        "server_signature_wall": sig_wall,
+        "server_apply_cpu": apply_cpu,
+        "server_apply_wall": apply_wall,
+        "client_encode_cpu": enc_cpu,
+        "client_encode_wall": enc_wall,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=2048)
+    parser.add_argument("--edits", type=int, default=10)
+    parser.add_argument("--edit-size", type=int, default=100)
+    parser.add_argument("--dir", type=Path, default=None, help="scratch directory (needs ~3x size free)")
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory(dir=args.dir) as workdir:
+        for insert in (False, True):
+            result = run(size, args.edits, args.edit_size, insert, Path(workdir))
+            label = "insert" if insert else "overwrite"
+            print(f"\n{args.edits} x {args.edit_size} B {label} in {args.size_mb} MiB "
+                  f"(block size {result['block_size']})")
+            print(f"  full upload        {result['file_bytes']:>14,} B")
+            print(f"  signature (gzip)   {result['signature_bytes']:>14,} B")
+            print(f"  delta              {result['delta_bytes']:>14,} B "
+                  f"({result['literal_bytes']:,} B literal)")
+            print(f"  bytes saved        {result['saved']:>14.2%}")
+            print(f"  server signature   {result['server_signature_cpu']:>9.2f} s cpu "
+                  f"{result['server_signature_wall']:>7.2f} s wall")
+            print(f"  server apply       {result['server_apply_cpu']:>9.2f} s cpu "
+                  f"{result['server_apply_wall']:>7.2f} s wall")
+            print(f"  client encode      {result['client_encode_cpu']:>9.2f} s cpu "
+                  f"{result['client_encode_wall']:>7.2f} s wall")
+
+
+if __name__ == "__main__":
+    main()
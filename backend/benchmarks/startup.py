@@ -0,0 +1,184 @@
+"""
+Cold start benchmark with a regression budget.
+
+Measures, in fresh processes, how long `import app.main` takes and how long
+a single uvicorn worker takes from spawn to its first successful request,
+then its first login and listing (which pay for the lazy initialization),
+and how long /health takes to answer while that login runs.
+Exits non-zero when a median goes over budget; the backend-checks workflow
+runs it on every change under backend/.
+
+Run from backend/:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# seconds, on the dev machine; a Pi is a few times slower, pass larger budgets there
+IMPORT_BUDGET = 0.6
+FIRST_REQUEST_BUDGET = 1.0
+# login right after the worker is up, so it may still wait on the bcrypt warm-up
+FIRST_LOGIN_BUDGET = 1.0
+# worst /health response while that login runs, i.e. how long the event loop stalls
+HEALTH_DURING_LOGIN_BUDGET = 0.1
+
+IMPORT_SNIPPET = (
+    "import time; started = time.perf_counter(); import app.main; "
+    "print(time.perf_counter() - started)"
+)
+
+
+def bench_env(storage: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("JWT_SECRET", "benchmark")
+    env.setdefault("DEBUG", "false")
+    env.setdefault("MAX_FILE_SIZE", str(100 * 1024 * 1024))
+    env.setdefault("CORS_ORIGINS", "*")
+    env.setdefault("ADMIN_PASSWORD", "benchmark")
+    env["STORAGE_PATH"] = storage
+    return env
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(url: str, data: dict = None, token: str = None) -> tuple:
+    body = json.dumps(data).encode() if data is not None else None
+    req = urllib.request.Request(url, data=body, method="POST" if body else "GET")
+    if body:
+        req.add_header("Content-Type", "application/json")
+    if token:
+        req.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(req, timeout=5) as response:
+        return response.status, response.read()
+
+
+def measure_import(env: dict) -> float:
+    out = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def measure_worker(env: dict, timeout: float = 30) -> dict:
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while True:
+            if time.perf_counter() - started > timeout:
+                raise SystemExit("server did not come up")
+            if server.poll() is not None:
+                raise SystemExit("server exited during startup")
+            try:
+                if request(f"{base}/health")[0] == 200:
+                    break
+            except OSError:
+                time.sleep(0.005)
+        first_request = time.perf_counter() - started
+
+        # poll /health while logging in, bcrypt must not stall the event loop
+        logging_in = threading.Event()
+        logging_in.set()
+        health_latencies = []
+
+        def poll_health():
+            while logging_in.is_set():
+                mark = time.perf_counter()
+                request(f"{base}/health")
+                health_latencies.append(time.perf_counter() - mark)
+                time.sleep(0.02)
+
+        poller = threading.Thread(target=poll_health)
+        poller.start()
+        try:
+            mark = time.perf_counter()
+            _, body = request(f"{base}/api/v1/auth/login",
+                              {"username": "admin", "password": env["ADMIN_PASSWORD"]})
+            first_login = time.perf_counter() - mark
+        finally:
+            logging_in.clear()
+            poller.join()
+        token = json.loads(body)["access_token"]
+
+        mark = time.perf_counter()
+        request(f"{base}/api/v1/files/list", token=token)
+        first_list = time.perf_counter() - mark
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "first_request": first_request,
+        "first_login": first_login,
+        "health_during_login": max(health_latencies),
+        "first_list": first_list,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET)
+    parser.add_argument("--first-request-budget", type=float, default=FIRST_REQUEST_BUDGET)
+    parser.add_argument("--first-login-budget", type=float, default=FIRST_LOGIN_BUDGET)
+    parser.add_argument("--health-during-login-budget", type=float, default=HEALTH_DURING_LOGIN_BUDGET)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as storage:
+        env = bench_env(storage)
+        imports = [measure_import(env) for _ in range(args.runs)]
+        workers = [measure_worker(env) for _ in range(args.runs)]
+
+    results = {
+        "import": statistics.median(imports),
+        "first_request": statistics.median(w["first_request"] for w in workers),
+        "first_login": statistics.median(w["first_login"] for w in workers),
+        "health_during_login": statistics.median(w["health_during_login"] for w in workers),
+        "first_list": statistics.median(w["first_list"] for w in workers),
+    }
+    budgets = {
+        "import": args.import_budget,
+        "first_request": args.first_request_budget,
+        "first_login": args.first_login_budget,
+        "health_during_login": args.health_during_login_budget,
+    }
+
+    print(f"median of {args.runs} runs, per worker process")
+    failed = []
+    for name, seconds in results.items():
+        budget = budgets.get(name)
+        verdict = ""
+        if budget is not None:
+            verdict = f"  budget {budget * 1000:.0f}ms " + ("ok" if seconds <= budget else "OVER")
+            if seconds > budget:
+                failed.append(name)
+        print(f"  {name:<20} {seconds * 1000:>8.1f}ms{verdict}")
+
+    if failed:
+        print(f"startup budget exceeded: {', '.join(failed)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Round-trip and malformed-input tests for the delta sync wire format.
+No server needed, run from backend/:
+    python -m unittest test_delta_sync
+"""
+import io
+import random
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.services.delta_sync import (
+    MAGIC, MAX_LITERAL, OP_COPY, OP_END, OP_LITERAL,
+    DeltaApplier, DeltaError, encode_delta, file_signature,
+)
+
+BLOCK_SIZE = 64
+
+
+def signature_of(data: bytes, block_size: int = BLOCK_SIZE) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "base"
+        path.write_bytes(data)
+        return file_signature(path, block_size)
+
+
+def encode(base: bytes, new: bytes, block_size: int = BLOCK_SIZE) -> bytes:
+    return b"".join(encode_delta(signature_of(base, block_size), io.BytesIO(new)))
+
+
+def apply(base: bytes, delta: bytes, block_size: int = BLOCK_SIZE,
+          chunk_sizes=None, max_size=None) -> DeltaApplier:
+    out = io.BytesIO()
+    applier = DeltaApplier(io.BytesIO(base), out, block_size, len(base), max_size)
+    chunk_sizes = chunk_sizes or [len(delta) or 1]
+    offset = 0
+    sizes = iter(chunk_sizes)
+    while offset < len(delta):
+        size = next(sizes, chunk_sizes[-1])
+        applier.feed(delta[offset:offset + size])
+        offset += size
+    applier.finish()
+    applier.result = out.getvalue()
+    return applier
+
+
+class RoundTripTests(unittest.TestCase):
+
+    def assertRoundTrip(self, base: bytes, new: bytes, block_size: int = BLOCK_SIZE) -> DeltaApplier:
+        delta = encode(base, new, block_size)
+        applier = apply(base, delta, block_size)
+        self.assertEqual(applier.result, new)
+        self.assertEqual(applier.copied_bytes + applier.literal_bytes, len(new))
+        return applier
+
+    def setUp(self):
+        self.rng = random.Random(1234)
+        self.base = self.rng.randbytes(BLOCK_SIZE * 40 + 17)
+
+    def test_identical_file_is_all_copies(self):
+        applier = self.assertRoundTrip(self.base, self.base)
+        self.assertEqual(applier.literal_bytes, 0)
+
+    def test_insert(self):
+        new = self.base[:1000] + b"inserted bytes" + self.base[1000:]
+        applier = self.assertRoundTrip(self.base, new)
+        self.assertLess(applier.literal_bytes, 3 * BLOCK_SIZE)
+
+    def test_delete(self):
+        new = self.base[:500] + self.base[700:]
+        applier = self.assertRoundTrip(self.base, new)
+        self.assertLess(applier.literal_bytes, 2 * BLOCK_SIZE)
+
+    def test_append_and_truncate(self):
+        self.assertRoundTrip(self.base, self.base + b"tail")
+        self.assertRoundTrip(self.base, self.base[:-100])
+
+    def test_short_tail_block_is_copied(self):
+        # base ends in a 17 byte block, an edit at the front must not turn it into a literal
+        new = b"x" + self.base[1:]
+        applier = self.assertRoundTrip(self.base, new)
+        self.assertEqual(applier.literal_bytes, BLOCK_SIZE)
+
+    def test_base_smaller_than_a_block(self):
+        self.assertRoundTrip(b"tiny", b"tiny but longer")
+        self.assertRoundTrip(b"tiny", b"tiny")
+
+    def test_empty_base(self):
+        applier = self.assertRoundTrip(b"", self.base)
+        self.assertEqual(applier.copied_bytes, 0)
+
+    def test_empty_new_file(self):
+        self.assertRoundTrip(self.base, b"")
+        self.assertRoundTrip(b"", b"")
+
+    def test_reordered_blocks(self):
+        blocks = [self.base[i:i + BLOCK_SIZE] for i in range(0, BLOCK_SIZE * 40, BLOCK_SIZE)]
+        self.rng.shuffle(blocks)
+        applier = self.assertRoundTrip(self.base, b"".join(blocks))
+        self.assertEqual(applier.literal_bytes, 0)
+
+    def test_literal_runs_are_split(self):
+        new = self.rng.randbytes(MAX_LITERAL * 2 + 123)
+        delta = encode(b"", new)
+        self.assertEqual(apply(b"", delta).result, new)
+
+    def test_chunked_feed(self):
+        new = self.base[:300] + b"changed" + self.base[900:] + b"more"
+        delta = encode(self.base, new)
+        for chunk_sizes in ([1], [2, 3, 5, 7], [len(MAGIC) - 1, 1, 13]):
+            self.assertEqual(apply(self.base, delta, chunk_sizes=chunk_sizes).result, new)
+
+    def test_random_edits(self):
+        for _ in range(100):
+            base = self.rng.randbytes(self.rng.randrange(0, BLOCK_SIZE * 20))
+            new = bytearray(base)
+            for _ in range(self.rng.randrange(0, 5)):
+                pos = self.rng.randrange(0, len(new) + 1)
+                if self.rng.random() < 0.5:
+                    new[pos:pos] = self.rng.randbytes(self.rng.randrange(1, 200))
+                else:
+                    del new[pos:pos + self.rng.randrange(1, 200)]
+            delta = encode(base, bytes(new))
+            sizes = [self.rng.randrange(1, 100)]
+            self.assertEqual(apply(base, delta, chunk_sizes=sizes).result, bytes(new))
+
+
+def copy_op(first: int, count: int) -> bytes:
+    return OP_COPY + struct.pack(">QI", first, count)
+
+
+def literal_op(data: bytes, length: int = None) -> bytes:
+    return OP_LITERAL + struct.pack(">I", len(data) if length is None else length) + data
+
+
+class MalformedDeltaTests(unittest.TestCase):
+    base = bytes(range(256)) * 2  # 8 blocks
+
+    def assertRejected(self, delta: bytes, max_size=None):
+        with self.assertRaises(DeltaError):
+            apply(self.base, delta, max_size=max_size)
+
+    def test_bad_magic(self):
+        self.assertRejected(b"XXXX" + OP_END)
+
+    def test_unknown_op(self):
+        self.assertRejected(MAGIC + b"Z" + OP_END)
+
+    def test_copy_out_of_range(self):
+        self.assertRejected(MAGIC + copy_op(7, 2) + OP_END)
+        self.assertRejected(MAGIC + copy_op(8, 1) + OP_END)
+
+    def test_empty_copy(self):
+        self.assertRejected(MAGIC + copy_op(0, 0) + OP_END)
+
+    def test_oversized_literal(self):
+        # refused from the length alone, before the bytes arrive
+        out = io.BytesIO()
+        applier = DeltaApplier(io.BytesIO(self.base), out, BLOCK_SIZE, len(self.base))
+        with self.assertRaises(DeltaError):
+            applier.feed(MAGIC + OP_LITERAL + struct.pack(">I", MAX_LITERAL + 1))
+
+    def test_result_over_max_size(self):
+        self.assertRejected(MAGIC + literal_op(b"x" * 10) + OP_END, max_size=9)
+
+    def test_truncated(self):
+        whole = MAGIC + copy_op(0, 1) + literal_op(b"abc") + OP_END
+        for cut in (0, 2, len(MAGIC), len(MAGIC) + 5, len(whole) - 3, len(whole) - 1):
+            with self.subTest(cut=cut):
+                self.assertRejected(whole[:cut])
+
+    def test_data_after_end(self):
+        self.assertRejected(MAGIC + OP_END + b"extra")
+        out = io.BytesIO()
+        applier = DeltaApplier(io.BytesIO(self.base), out, BLOCK_SIZE, len(self.base))
+        applier.feed(MAGIC + OP_END)
+        with self.assertRaises(DeltaError):
+            applier.feed(b"more")
+
+    def test_base_shrunk_while_applying(self):
+        out = io.BytesIO()
+        applier = DeltaApplier(io.BytesIO(self.base[:100]), out, BLOCK_SIZE, len(self.base))
+        with self.assertRaises(DeltaError):
+            applier.feed(MAGIC + copy_op(0, 8) + OP_END)
+
+
+if __name__ == "__main__":
+    unittest.main()
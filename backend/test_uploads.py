@@ -0,0 +1,82 @@
+"""
+Tests for the streaming multipart reader used by /files/upload.
+No server needed, run from backend/:
+    python -m unittest test_uploads
+"""
+import unittest
+
+from fastapi import HTTPException
+
+from app.utils.uploads import MultipartFileReader
+
+BOUNDARY = "testboundary"
+CONTENT_TYPE = f"multipart/form-data; boundary={BOUNDARY}"
+
+
+def part(name: str, data: bytes, filename: str = None) -> bytes:
+    disposition = f'form-data; name="{name}"'
+    if filename is not None:
+        disposition += f'; filename="{filename}"'
+    return (
+        f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n"
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode() + data + b"\r\n"
+
+
+def body(*parts: bytes) -> bytes:
+    return b"".join(parts) + f"--{BOUNDARY}--\r\n".encode()
+
+
+def read(content: bytes, chunk_size: int = None, content_type: str = CONTENT_TYPE):
+    reader = MultipartFileReader(content_type)
+    chunk_size = chunk_size or len(content) or 1
+    data = b""
+    for offset in range(0, len(content), chunk_size):
+        data += b"".join(reader.feed(content[offset:offset + chunk_size]))
+    reader.finish()
+    return reader.filename, data
+
+
+class MultipartFileReaderTests(unittest.TestCase):
+    payload = bytes(range(256)) * 50 + f"\r\n--{BOUNDARY}x".encode()
+
+    def assertBadRequest(self, content: bytes, content_type: str = CONTENT_TYPE):
+        with self.assertRaises(HTTPException) as caught:
+            read(content, content_type=content_type)
+        self.assertEqual(caught.exception.status_code, 400)
+
+    def test_valid_body(self):
+        content = body(part("file", self.payload, "photo.jpg"))
+        self.assertEqual(read(content), ("photo.jpg", self.payload))
+
+    def test_other_fields_are_ignored(self):
+        content = body(part("note", b"hello"), part("file", self.payload, "a.bin"), part("file", b"second", "b.bin"))
+        self.assertEqual(read(content), ("a.bin", self.payload))
+
+    def test_empty_file(self):
+        self.assertEqual(read(body(part("file", b"", "empty.txt"))), ("empty.txt", b""))
+
+    def test_chunked(self):
+        content = body(part("file", self.payload, "photo.jpg"))
+        for chunk_size in (1, 7, 1000):
+            with self.subTest(chunk_size=chunk_size):
+                self.assertEqual(read(content, chunk_size), ("photo.jpg", self.payload))
+
+    def test_missing_file_field(self):
+        self.assertBadRequest(body(part("other", b"data", "x.txt")))
+        self.assertBadRequest(body(part("file", b"not a file")))
+
+    def test_truncated_body(self):
+        content = body(part("file", self.payload, "photo.jpg"))
+        self.assertBadRequest(content[:len(content) // 2])
+
+    def test_garbage(self):
+        self.assertBadRequest(b"this is not multipart at all")
+
+    def test_wrong_content_type(self):
+        self.assertBadRequest(body(part("file", b"x", "x")), content_type="application/octet-stream")
+        self.assertBadRequest(body(part("file", b"x", "x")), content_type="multipart/form-data")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -87,6 +87,19 @@ const FileBrowser = ({
     loadDirectory(currentPath);
   }, [currentPath, refreshTrigger]);
 
+  // refetch quietly when something changes in the open directory
+  useEffect(() => {
+    let timer = null;
+    const unsubscribe = fileService.subscribeToChanges(currentPath, () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => loadDirectory(currentPath, { silent: true }), 100);
+    });
+    return () => {
+      clearTimeout(timer);
+      unsubscribe();
+    };
+  }, [currentPath]);
+
   // Show demo modal for demo users
   useEffect(() => {
     if (user?.username === 'demo') {
@@ -94,16 +107,20 @@ const FileBrowser = ({
     }
   }, [user]);
 
-  const loadDirectory = async (path) => {
+  const loadDirectory = async (path, { silent = false } = {}) => {
     try {
-      setLoading(true);
+      if (!silent) {
+        setLoading(true);
+      }
       setError(null);
       const data = await fileService.listDirectory(path);
       setFiles(data.items);
     } catch (error) {
       setError(error.response?.data?.error || error.response?.data?.detail || 'Failed to load directory');
     } finally {
-      setLoading(false);
+      if (!silent) {
+        setLoading(false);
+      }
     }
   };
 
@@ -8,6 +8,58 @@ export const fileService = {
         return response.data;
     },
 
+    // live changes in one directory, returns a function that closes the stream
+    subscribeToChanges: (path = '/', onChange) => {
+        // EventSource can't send headers, so each connect uses a short lived
+        // stream ticket in the query instead of the bearer token
+        let source = null;
+        let retryTimer = null;
+        let lastEventId = null;
+        let closed = false;
+
+        const connect = async () => {
+            let ticket;
+            try {
+                ticket = (await api.post('/auth/stream-ticket')).data.ticket;
+            } catch (error) {
+                retryTimer = setTimeout(connect, 5000);
+                return;
+            }
+            if (closed) {
+                return;
+            }
+            const params = new URLSearchParams({ path, ticket });
+            if (lastEventId) {
+                params.set('since', lastEventId);
+            }
+            source = new EventSource(`${api.defaults.baseURL}/files/events?${params}`);
+            source.addEventListener('ready', (event) => {
+                lastEventId = event.lastEventId;
+            });
+            ['created', 'modified', 'deleted', 'resync'].forEach((type) => {
+                source.addEventListener(type, (event) => {
+                    lastEventId = event.lastEventId;
+                    onChange(JSON.parse(event.data));
+                });
+            });
+            // the browser's own retry reuses the expired ticket, so reconnect with a new one
+            source.onerror = () => {
+                if (source.readyState === EventSource.CLOSED && !closed) {
+                    retryTimer = setTimeout(connect, 3000);
+                }
+            };
+        };
+
+        connect();
+        return () => {
+            closed = true;
+            clearTimeout(retryTimer);
+            if (source) {
+                source.close();
+            }
+        };
+    },
+
     uploadFile: async (file, path = '/') => {
         const formData = new FormData();
         formData.append('file', file);